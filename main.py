@@ -1,14 +1,17 @@
 import os
-import re
 import json
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from io import BytesIO
 import asyncio
 
 import streamlit as st
 from dotenv import load_dotenv
-from jinja2 import Template
-from playwright.sync_api import sync_playwright
+from jinja2 import DictLoader, Environment, select_autoescape
+from playwright.async_api import async_playwright
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageOps, features
+from fontTools.ttLib import TTFont
 
 import google.genai as genai
 from google.genai import types as genai_types
@@ -36,40 +39,67 @@ TEXT_MODEL = "gemini-2.5-pro"
 POSTER_WIDTH = 1080
 POSTER_HEIGHT = 1080
 FOOTER_HEIGHT = 210  # bottom strip for photo + name
+FOOTER_PHOTO_SIZE = 150  # circular agent photo, CSS px
+POSTER_DPR = int(os.getenv("POSTER_DPR", "1"))  # 2 for Retina-class output
+
+STYLE_MODES = ["Standard marketing", "Conversation", "Fact-based awareness"]
+TEXT_VARIANTS = 3  # copy variants requested per Gemini call
+
+
+# =========================
+# FONT HELPERS
+# =========================
+
+@st.cache_resource
+def _font_data_urls():
+    """Local Tamil fonts → data URLs, encoded once per process."""
+    urls = []
+    for path in ("NotoSansTamil-Regular.ttf", "NotoSansTamil-Bold.ttf"):
+        with open(path, "rb") as f:
+            b64 = base64.b64encode(f.read()).decode("ascii")
+        urls.append(f"data:font/ttf;base64,{b64}")
+    return tuple(urls)
 
 
 # =========================
 # COLOR HELPERS
 # =========================
 
+_COLOR_TABLE = {
+    "dark_blue": "#0f172a",
+    "navy": "#0f172a",
+    "blue": "#1d4ed8",
+    "sky_blue": "#0ea5e9",
+    "dark_green": "#166534",
+    "green": "#16a34a",
+    "red": "#b91c1c",
+    "maroon": "#7f1d1d",
+    "orange": "#ea580c",
+    "gold": "#facc15",
+    "black": "#111827",
+    "dark_gray": "#374151",
+    "white": "#f9fafb",
+}
+
+# (top gradient, bottom gradient, footer)
+_THEMES = {
+    "blue_orange": ("#e0f2fe", "#ffedd5", "#0f172a"),
+    "green_gold": ("#e8f7eb", "#fef6d8", "#14532d"),
+    "red_yellow": ("#fee2e2", "#fef9c3", "#7f1d1d"),
+    "yellow_blue": ("#fef9c3", "#dbeafe", "#1e3a8a"),
+}
+_DEFAULT_THEME = _THEMES["blue_orange"]
+_VALID_THEMES = frozenset(_THEMES)
+
+_DEFAULT_TEXT_COLORS = {"headline": "dark_blue", "body": "black", "cta": "red"}
+
+
 def color_from_name(name: str, fallback: str = "#111827") -> str:
-    table = {
-        "dark_blue": "#0f172a",
-        "navy": "#0f172a",
-        "blue": "#1d4ed8",
-        "sky_blue": "#0ea5e9",
-        "dark_green": "#166534",
-        "green": "#16a34a",
-        "red": "#b91c1c",
-        "maroon": "#7f1d1d",
-        "orange": "#ea580c",
-        "gold": "#facc15",
-        "black": "#111827",
-        "dark_gray": "#374151",
-        "white": "#f9fafb",
-    }
-    return table.get(name, fallback)
+    return _COLOR_TABLE.get(name, fallback)
 
 
 def theme_colors(theme: str):
-    if theme == "green_gold":
-        return "#e8f7eb", "#fef6d8", "#14532d"
-    if theme == "red_yellow":
-        return "#fee2e2", "#fef9c3", "#7f1d1d"
-    if theme == "yellow_blue":
-        return "#fef9c3", "#dbeafe", "#1e3a8a"
-    # default blue_orange
-    return "#e0f2fe", "#ffedd5", "#0f172a"
+    return _THEMES.get(theme, _DEFAULT_THEME)
 
 
 # =========================
@@ -109,14 +139,67 @@ STYLE:
 # GEMINI TEXT GENERATION
 # =========================
 
-def generate_text(style_mode: str):
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _is_text_spec(obj) -> bool:
+    return isinstance(obj, dict) and "headline_ta" in obj
+
+
+def _extract_json(raw: str):
     """
-    Ask Gemini for compact Tamil insurance copy, aware of poster layout
-    and style mode. Robustly extracts text from the response.
+    Decode the first poster-copy JSON (array, or a lone object) in `raw`.
+    Markdown fences and chatter are skipped by jumping between '[' / '{'
+    candidates and letting raw_decode try each one in place; no regex.
     """
+    error = None
+    i = 0
+    while True:
+        starts = [j for j in (raw.find("[", i), raw.find("{", i)) if j != -1]
+        if not starts:
+            break
+        i = min(starts)
+        try:
+            parsed, _ = _JSON_DECODER.raw_decode(raw, i)
+        except ValueError as e:
+            error = error or e
+        else:
+            # skip prose like "[3]" and nested fragments like text_colors
+            if _is_text_spec(parsed) or (
+                isinstance(parsed, list) and any(map(_is_text_spec, parsed))
+            ):
+                return parsed
+        i += 1
+
+    if error:
+        raise ValueError(f"Failed to parse JSON from Gemini: {error}\nRaw:\n{raw}")
+    raise ValueError("Could not find JSON in Gemini output:\n" + raw)
+
+
+def _normalize_text_spec(spec: dict) -> dict:
+    theme = spec.get("color_theme")
+    valid = isinstance(theme, str) and theme in _VALID_THEMES
+    spec["color_theme"] = theme if valid else "blue_orange"
+
+    bullets = spec.get("bullet_points_ta") or []
+    if not isinstance(bullets, list):
+        bullets = [str(bullets)]
+    spec["bullet_points_ta"] = [b for b in bullets if b][:3]
+
+    text_colors = spec.get("text_colors")
+    if not isinstance(text_colors, dict):
+        text_colors = {}
+    # only string names can be looked up in _COLOR_TABLE
+    text_colors = {k: v for k, v in text_colors.items() if isinstance(v, str)}
+    spec["text_colors"] = {**_DEFAULT_TEXT_COLORS, **text_colors}
+
+    return spec
+
+
+def _build_prompt(style_mode: str, n_variants: int) -> str:
     style_block = build_style_block(style_mode)
 
-    prompt = f"""
+    return f"""
 நீ ஒரு அனுபவம் வாய்ந்த தமிழ் இன்ஷூரன்ஸ் மார்க்கெட்டிங் காபி ரைட்டர்.
 
 இந்த போஸ்டர் டிசைன் அளவு:
@@ -156,24 +239,50 @@ CONTENT STRUCTURE (தமிழில் நிரப்ப):
      "cta": "red | dark_blue | green | orange"
    }}
 
-STRICTLY இந்த JSON format மட்டும் return பண்ணு
+{n_variants} வெவ்வேறு variants எழுது (ஒவ்வொன்றிலும் வேறு headline, wording, color_theme).
+
+STRICTLY {n_variants} objects கொண்ட இந்த JSON array format மட்டும் return பண்ணு
 (extra text, explanation, markdown எதுவும் இல்லாமல்):
 
-{{
-  "headline_ta": "...",
-  "subheadline_ta": "...",
-  "body_paragraph_ta": "...",
-  "bullet_points_ta": ["...", "...", "..."],
-  "cta_line_ta": "...",
-  "color_theme": "blue_orange",
-  "text_colors": {{
-    "headline": "dark_blue",
-    "body": "black",
-    "cta": "red"
-  }}
-}}
+[
+  {{
+    "headline_ta": "...",
+    "subheadline_ta": "...",
+    "body_paragraph_ta": "...",
+    "bullet_points_ta": ["...", "...", "..."],
+    "cta_line_ta": "...",
+    "color_theme": "blue_orange",
+    "text_colors": {{
+      "headline": "dark_blue",
+      "body": "black",
+      "cta": "red"
+    }}
+  }},
+  ...
+]
 """
 
+
+@st.cache_resource
+def _get_prompts() -> dict:
+    """Only three style modes exist, so build each default-sized prompt once per process."""
+    return {mode: _build_prompt(mode, TEXT_VARIANTS) for mode in STYLE_MODES}
+
+
+def generate_text(
+    style_mode: str, n_variants: int = TEXT_VARIANTS
+) -> list[dict]:
+    """
+    Ask Gemini for compact Tamil insurance copy, aware of poster layout
+    and style mode. One call returns `n_variants` alternatives so the user
+    can compare styles without another round-trip. Robustly extracts text
+    from the response.
+    """
+    if n_variants == TEXT_VARIANTS:
+        prompt = _get_prompts()[style_mode]
+    else:
+        prompt = _build_prompt(style_mode, n_variants)
+
     result = client.models.generate_content(
         model=TEXT_MODEL,
         contents=[prompt],
@@ -205,61 +314,25 @@ STRICTLY இந்த JSON format மட்டும் return பண்ணு
             "Try again or change the style."
         )
 
-    # -------- JSON extraction as before --------
-    m = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", raw, re.S | re.I)
-    json_text = None
-    if m:
-        json_text = m.group(1)
-    else:
-        start = raw.find("{")
-        if start != -1:
-            depth = 0
-            for i in range(start, len(raw)):
-                if raw[i] == "{":
-                    depth += 1
-                elif raw[i] == "}":
-                    depth -= 1
-                    if depth == 0:
-                        json_text = raw[start : i + 1]
-                        break
-
-    if not json_text:
-        raise ValueError("Could not find JSON in Gemini output:\n" + raw)
-
-    try:
-        parsed = json.loads(json_text)
-    except Exception as e:
-        raise ValueError(
-            f"Failed to parse JSON from Gemini: {e}\nExtracted:\n{json_text}"
-        )
-
-    # -------- normalize fields --------
-    theme = parsed.get("color_theme", "blue_orange")
-    if theme not in ["blue_orange", "green_gold", "red_yellow", "yellow_blue"]:
-        theme = "blue_orange"
-    parsed["color_theme"] = theme
+    # -------- JSON extraction --------
+    parsed = _extract_json(raw)
 
-    bullets = parsed.get("bullet_points_ta") or []
-    if not isinstance(bullets, list):
-        bullets = [str(bullets)]
-    parsed["bullet_points_ta"] = bullets[:3]
+    # the model occasionally ignores the array and returns a single object
+    if isinstance(parsed, dict):
+        parsed = [parsed]
 
-    text_colors = parsed.get("text_colors") or {}
-    parsed["text_colors"] = {
-        "headline": text_colors.get("headline", "dark_blue"),
-        "body": text_colors.get("body", "black"),
-        "cta": text_colors.get("cta", "red"),
-    }
+    variants = [_normalize_text_spec(v) for v in parsed if _is_text_spec(v)]
+    if not variants:
+        raise ValueError("Gemini returned no usable variants:\n" + raw)
 
-    return parsed
+    return variants[:n_variants]
 
 
 # =========================
 # HTML POSTER TEMPLATE  (square, layout A)
 # =========================
 
-POSTER_HTML = Template(
-    r"""<!DOCTYPE html>
+POSTER_HTML_SOURCE = r"""<!DOCTYPE html>
 <html lang="ta">
 <head>
   <meta charset="UTF-8" />
@@ -291,7 +364,7 @@ POSTER_HTML = Template(
     }
 
     body {
-      background: linear-gradient(to bottom, {{ top_color }}, {{ bottom_color }});
+      background: linear-gradient(to bottom, var(--top-color), var(--bottom-color));
       margin: 0;
     }
     .poster {
@@ -313,26 +386,26 @@ POSTER_HTML = Template(
       font-size: 46px;
       font-weight: 700;
       text-align: center;
-      color: {{ headline_color }};
+      color: var(--headline-color);
       margin-bottom: 12px;
       line-height: 1.3;
     }
     .subheadline {
       font-size: 26px;
       text-align: center;
-      color: {{ headline_color }};
+      color: var(--headline-color);
       margin-bottom: 18px;
       line-height: 1.4;
     }
     .body {
       font-size: 23px;
-      color: {{ body_color }};
+      color: var(--body-color);
       margin-bottom: 12px;
       line-height: 1.6;
     }
     .bullets {
       font-size: 22px;
-      color: {{ body_color }};
+      color: var(--body-color);
       margin-bottom: 18px;
       line-height: 1.6;
     }
@@ -344,25 +417,25 @@ POSTER_HTML = Template(
       font-size: 24px;
       font-weight: 700;
       text-align: center;
-      color: {{ cta_color }};
+      color: var(--cta-color);
       margin-top: 16px;
     }
 
     .footer {
       height: {{ footer_height }}px;
-      background: {{ footer_color }};
+      background: var(--footer-color);
       display: flex;
       align-items: center;
       padding: 20px 60px;
       color: #f9fafb;
     }
     .footer-photo {
-      width: 150px;
-      height: 150px;
+      width: {{ photo_size }}px;
+      height: {{ photo_size }}px;
       border-radius: 50%;
       background-size: cover;
       background-position: center;
-      background-image: url('{{ photo_data_url }}');
+      background-image: var(--photo);
       flex-shrink: 0;
     }
     .footer-text {
@@ -388,52 +461,472 @@ POSTER_HTML = Template(
 <body>
   <div class="poster">
     <div class="main">
-      <div class="headline">{{ headline }}</div>
-      {% if subheadline %}
-      <div class="subheadline">{{ subheadline }}</div>
-      {% endif %}
-      <div class="body">{{ body_paragraph }}</div>
-      <div class="bullets">
-        {% for b in bullet_points %}
-          <div class="bullet-item">• {{ b }}</div>
-        {% endfor %}
-      </div>
-      <div class="cta">{{ cta_line }}</div>
+      <div class="headline" id="headline"></div>
+      <div class="subheadline" id="subheadline"></div>
+      <div class="body" id="body_paragraph"></div>
+      <div class="bullets" id="bullet_points"></div>
+      <div class="cta" id="cta_line"></div>
     </div>
     <div class="footer">
       <div class="footer-photo"></div>
       <div class="footer-text">
-        <div class="footer-name">{{ agent_name }}</div>
-        <div class="footer-role">{{ agent_role }}</div>
-        <div class="footer-phone">📞 {{ agent_phone }}</div>
+        <div class="footer-name" id="agent_name"></div>
+        <div class="footer-role" id="agent_role"></div>
+        <div class="footer-phone" id="agent_phone"></div>
       </div>
     </div>
   </div>
 </body>
 </html>
 """
-)
+
+# Swaps one poster's content into the already-loaded shell. Resolves once the
+# photo has decoded so the screenshot never catches an empty footer circle.
+_POSTER_FILL_JS = """
+async (data) => {
+  const root = document.documentElement.style;
+  for (const key of ["top_color", "bottom_color", "footer_color",
+                     "headline_color", "body_color", "cta_color"]) {
+    root.setProperty("--" + key.replace("_", "-"), data[key]);
+  }
+  for (const key of ["headline", "subheadline", "body_paragraph",
+                     "cta_line", "agent_name", "agent_role"]) {
+    document.getElementById(key).textContent = data[key];
+  }
+  document.getElementById("subheadline").hidden = !data.subheadline;
+  document.getElementById("agent_phone").textContent = "📞 " + data.agent_phone;
+  document.getElementById("bullet_points").replaceChildren(
+    ...data.bullet_points.map((b) => {
+      const item = document.createElement("div");
+      item.className = "bullet-item";
+      item.textContent = "• " + b;
+      return item;
+    })
+  );
+
+  const photo = new Image();
+  photo.src = data.photo_data_url;
+  await photo.decode();
+  root.setProperty("--photo", `url("${data.photo_data_url}")`);
+  return true;
+}
+"""
+
+@st.cache_resource
+def get_poster_template():
+    """Compile the poster template once per process."""
+    env = Environment(
+        loader=DictLoader({"poster.html": POSTER_HTML_SOURCE}),
+        autoescape=select_autoescape(["html"]),
+        cache_size=1,
+        auto_reload=False,
+    )
+    return env.get_template("poster.html")
 
 
 # =========================
-# RENDER HTML → PNG (Playwright)
+# RENDER HTML → IMAGE (Playwright)
 # =========================
 
-def html_to_png(html: str, width: int, height: int) -> bytes:
+# fonts.ready alone can resolve before layout has requested the lazily loaded
+# faces, so explicitly load both weights the poster uses first.
+_FONTS_READY_JS = """
+() => Promise.all([
+  document.fonts.load("400 23px NotoTamil", "தமிழ்"),
+  document.fonts.load("700 46px NotoTamil", "தமிழ்"),
+]).then(() => document.fonts.ready).then(() => true)
+"""
+
+
+# seconds; a hung Chromium call must not hold the shared page lock forever
+BROWSER_TIMEOUT = 30
+
+
+def _run_on_loop(loop, coro):
+    """Run `coro` on the browser loop, cancelling it if it overruns the timeout."""
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout=BROWSER_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+
+
+@st.cache_resource
+def get_browser():
+    """
+    Launch headless Chromium once and keep it alive across Streamlit reruns.
+    Playwright's async objects are bound to the loop that created them, so the
+    browser lives on its own event loop in a daemon thread.
+    """
+    try:
+        # uvloop speeds up Playwright's IPC with Chromium; optional, not on Windows
+        import uvloop
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def launch():
+        playwright = await async_playwright().start()
+        return playwright, await playwright.chromium.launch()
+
+    playwright, browser = _run_on_loop(loop, launch())
+    return loop, playwright, browser
+
+
+@st.cache_resource
+def get_poster_page():
+    """
+    Open one page with the poster shell (fonts + CSS) loaded and its fonts
+    decoded. cache_resource makes this a one-time init per process; every
+    render afterwards only swaps content into the same page.
+    """
+    loop, _, browser = get_browser()
+    regular_font_data_url, bold_font_data_url = _font_data_urls()
+    shell = get_poster_template().render({
+        "width": POSTER_WIDTH,
+        "height": POSTER_HEIGHT,
+        "footer_height": FOOTER_HEIGHT,
+        "photo_size": FOOTER_PHOTO_SIZE,
+        "regular_font_data_url": regular_font_data_url,
+        "bold_font_data_url": bold_font_data_url,
+    })
+
+    async def open_shell():
+        context = await browser.new_context(
+            viewport={"width": POSTER_WIDTH, "height": POSTER_HEIGHT},
+            device_scale_factor=POSTER_DPR,
+        )
+        page = await context.new_page()
+        await page.set_content(shell, wait_until="domcontentloaded")
+        # fonts are embedded as data URLs, so this resolves once they decode
+        await page.evaluate(_FONTS_READY_JS)
+        # renders share the page, so they must not interleave
+        return page, asyncio.Lock()
+
+    page, lock = _run_on_loop(loop, open_shell())
+    return loop, page, lock
+
+
+@st.cache_resource
+def _browser_reset_lock() -> threading.Lock:
+    return threading.Lock()
+
+
+def _discard_browser_state(loop, playwright, browser, page, hung: bool) -> None:
     """
-    Render the given HTML to a PNG using headless Chromium via Playwright.
+    Drop cached Chromium resources that can no longer render, so the next
+    render starts a fresh page (and browser, if Chromium itself went away).
+    Only the cached entry that actually failed is evicted: renders queued on
+    the same broken page fail too, and must not evict a replacement that
+    another session has created in the meantime.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page(
-            viewport={"width": width, "height": height, "deviceScaleFactor": 1}
+    with _browser_reset_lock():
+        if not browser.is_connected():
+            # while the dead browser is cached, any cached page was opened on it
+            if get_browser()[2] is browser:
+                get_poster_page.clear()
+                get_browser.clear()
+                future = asyncio.run_coroutine_threadsafe(playwright.stop(), loop)
+                future.add_done_callback(lambda _: loop.call_soon_threadsafe(loop.stop))
+            return
+
+        if page is None or not (hung or page.is_closed()):
+            return
+        try:
+            current = get_poster_page()[1]
+        except Exception:
+            current = None
+        if current is page:
+            get_poster_page.clear()
+        if not page.is_closed():
+            asyncio.run_coroutine_threadsafe(page.context.close(), loop)
+
+
+async def _render_image(page, lock, data: dict, lossless: bool) -> bytes:
+    clip = {"x": 0, "y": 0, "width": POSTER_WIDTH, "height": POSTER_HEIGHT}
+    async with lock:
+        await page.evaluate(_POSTER_FILL_JS, data)
+        if lossless:
+            return await page.screenshot(type="png", clip=clip, omit_background=False)
+        return await page.screenshot(
+            type="jpeg", quality=92, clip=clip, omit_background=False
         )
-        page.set_content(html, wait_until="networkidle")
-        # small delay to ensure fonts are applied
-        page.wait_for_timeout(800)
-        png_bytes = page.screenshot(full_page=False)
-        browser.close()
-    return png_bytes
+
+
+def poster_to_image(data: dict, lossless: bool = False) -> bytes:
+    """
+    Render one poster to a JPEG (or PNG when `lossless`) by filling `data`
+    into the warm shell page of the shared headless Chromium. A crashed
+    browser or closed/hung page is discarded so later renders recover.
+    """
+    loop, playwright, browser = get_browser()
+    page = None
+    try:
+        _, page, lock = get_poster_page()
+        return _run_on_loop(loop, _render_image(page, lock, data, lossless))
+    except Exception as e:
+        hung = isinstance(e, FutureTimeoutError)
+        _discard_browser_state(loop, playwright, browser, page, hung)
+        raise
+
+
+# =========================
+# RENDER DIRECTLY (Pillow)
+# =========================
+
+# The layout is fixed, so Pillow can draw it without a browser. Tamil needs
+# libraqm for correct glyph shaping; without it, fall back to Chromium.
+POSTER_RENDERER = os.getenv("POSTER_RENDERER", "pillow")
+USE_PILLOW = POSTER_RENDERER == "pillow" and features.check("raqm")
+
+
+@st.cache_resource
+def _pillow_font(bold: bool, size: int) -> ImageFont.FreeTypeFont:
+    path = "NotoSansTamil-Bold.ttf" if bold else "NotoSansTamil-Regular.ttf"
+    return ImageFont.truetype(path, size, layout_engine=ImageFont.Layout.RAQM)
+
+
+@st.cache_resource
+def _font_codepoints() -> frozenset:
+    """Code points both bundled Tamil fonts have glyphs for."""
+    regular = TTFont("NotoSansTamil-Regular.ttf").getBestCmap()
+    bold = TTFont("NotoSansTamil-Bold.ttf").getBestCmap()
+    return frozenset(regular) & frozenset(bold)
+
+
+# invisible shaping controls that Tamil text may carry without a glyph
+_ZERO_WIDTH = frozenset("\u200c\u200d")
+
+
+def pillow_can_draw(data: dict) -> bool:
+    """
+    Pillow has no font fallback, so anything the Tamil font lacks (emoji,
+    other scripts) would come out as tofu; such posters go to Chromium.
+    """
+    codepoints = _font_codepoints()
+    texts = [data[k] for k in (
+        "headline", "subheadline", "body_paragraph", "cta_line",
+        "agent_name", "agent_role", "agent_phone",
+    )] + data["bullet_points"]
+    return all(
+        ch.isspace() or ch in _ZERO_WIDTH or ord(ch) in codepoints
+        for text in texts for ch in str(text)
+    )
+
+
+def _wrap_lines(draw, text: str, font, max_width: float) -> list[str]:
+    """Greedy word wrap by rendered width, collapsing whitespace like CSS."""
+    lines, line = [], ""
+    for word in str(text).split():
+        candidate = f"{line} {word}" if line else word
+        if line and draw.textlength(candidate, font=font) > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _draw_block(
+    draw, y: float, text: str, font, line_height: float,
+    x: float, max_width: float, fill: str, center: bool = False, dry: bool = False,
+) -> float:
+    """
+    Draw wrapped text from `y` down; returns the y just below it. With `dry`
+    only the height is measured.
+    """
+    for line in _wrap_lines(draw, text, font, max_width):
+        mid = y + line_height / 2
+        if not dry:
+            if center:
+                draw.text((x + max_width / 2, mid), line, font=font, fill=fill, anchor="mm")
+            else:
+                draw.text((x, mid), line, font=font, fill=fill, anchor="lm")
+        y += line_height
+    return y
+
+
+def _circle_photo(photo_bytes: bytes, size: int) -> tuple:
+    """
+    Photo cropped like `background-size: cover` plus an antialiased round
+    mask. Transparent areas of the photo stay transparent, as in the CSS.
+    """
+    photo = ImageOps.fit(Image.open(BytesIO(photo_bytes)).convert("RGBA"), (size, size), Image.LANCZOS)
+    mask = Image.new("L", (size * 4, size * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size * 4 - 1, size * 4 - 1), fill=255)
+    mask = ImageChops.multiply(mask.resize((size, size), Image.LANCZOS), photo.getchannel("A"))
+    return photo.convert("RGB"), mask
+
+
+def _draw_phone_icon(draw, x: float, mid: float, size: int, fill: str) -> float:
+    """Outline of a handset vertically centred on `mid`; returns its width."""
+    w, h = size * 0.6, size
+    top = mid - h / 2
+    stroke = max(2, size // 10)
+    draw.rounded_rectangle((x, top, x + w, top + h), radius=size * 0.15,
+                           outline=fill, width=stroke)
+    r = stroke * 0.8
+    draw.ellipse((x + w / 2 - r, top + h - 3 * r, x + w / 2 + r, top + h - r), fill=fill)
+    return w
+
+
+# font scale steps tried, largest first, when the copy would overflow
+_FIT_SCALES = (1.0, 0.93, 0.86, 0.8, 0.74, 0.68)
+
+
+def _draw_main(draw, data: dict, s: int, k: float, dry: bool = False) -> float:
+    """
+    Main copy with padding 70px 80px and the CSS font sizes / line-heights /
+    margins, fonts scaled by `k`. Returns the bottom edge incl. padding.
+    """
+    def size(px):
+        return max(1, round(px * s * k))
+
+    x, max_width = 80 * s, (POSTER_WIDTH - 160) * s
+    y = 70 * s
+
+    font = _pillow_font(True, size(46))
+    y = _draw_block(draw, y, data["headline"], font, font.size * 1.3,
+                    x, max_width, data["headline_color"], center=True, dry=dry) + 12 * s
+    if data["subheadline"]:
+        font = _pillow_font(False, size(26))
+        y = _draw_block(draw, y, data["subheadline"], font, font.size * 1.4,
+                        x, max_width, data["headline_color"], center=True, dry=dry) + 18 * s
+    font = _pillow_font(False, size(23))
+    y = _draw_block(draw, y, data["body_paragraph"], font, font.size * 1.6,
+                    x, max_width, data["body_color"], dry=dry) + 12 * s
+    font = _pillow_font(False, size(22))
+    for b in data["bullet_points"]:
+        y = _draw_block(draw, y, f"• {b}", font, font.size * 1.6,
+                        x + 16 * s, max_width - 16 * s, data["body_color"], dry=dry) + 4 * s
+    y += (18 + 16) * s
+    font = _pillow_font(True, size(24))
+    y = _draw_block(draw, y, data["cta_line"], font, sum(font.getmetrics()),
+                    x, max_width, data["cta_color"], center=True, dry=dry)
+    return y + 10 * s
+
+
+def render_with_pillow(data: dict, photo_bytes: bytes) -> Image.Image:
+    """
+    Draw the poster straight onto a Pillow image, mirroring the CSS of
+    POSTER_HTML_SOURCE.
+    """
+    s = POSTER_DPR
+    width, height = POSTER_WIDTH * s, POSTER_HEIGHT * s
+
+    # body background gradient, top → bottom
+    poster = Image.composite(
+        Image.new("RGB", (width, height), data["bottom_color"]),
+        Image.new("RGB", (width, height), data["top_color"]),
+        Image.linear_gradient("L").resize((width, height)),
+    )
+    draw = ImageDraw.Draw(poster)
+
+    # shrink the copy until it clears the footer; Chromium would let the
+    # footer paint over overflowing text
+    footer_top = (POSTER_HEIGHT - FOOTER_HEIGHT) * s
+    for k in _FIT_SCALES:
+        if _draw_main(draw, data, s, k, dry=True) <= footer_top:
+            break
+    _draw_main(draw, data, s, k)
+
+    # footer: strip with circular photo, then name / role / phone column
+    draw.rectangle((0, footer_top, width, height), fill=data["footer_color"])
+
+    photo_size = FOOTER_PHOTO_SIZE * s
+    photo, mask = _circle_photo(photo_bytes, photo_size)
+    photo_top = footer_top + (FOOTER_HEIGHT * s - photo_size) // 2
+    poster.paste(photo, (60 * s, photo_top), mask)
+
+    lines = [
+        (data["agent_name"], _pillow_font(True, 28 * s)),
+        (data["agent_role"], _pillow_font(False, 22 * s)),
+        (data["agent_phone"], _pillow_font(False, 22 * s)),
+    ]
+    heights = [sum(f.getmetrics()) for _, f in lines]
+    text_x = (60 + FOOTER_PHOTO_SIZE + 32) * s
+    ty = footer_top + (FOOTER_HEIGHT * s - sum(heights) - 2 * 8 * s) / 2
+    for i, ((text, f), h) in enumerate(zip(lines, heights)):
+        x = text_x
+        if i == len(lines) - 1:
+            # stands in for the 📞 of the HTML footer; the Tamil font has no emoji
+            x += _draw_phone_icon(draw, x, ty + h / 2, f.size, "#f9fafb") + 8 * s
+        draw.text((x, ty + h / 2), str(text), font=f, fill="#f9fafb", anchor="lm")
+        ty += h + 8 * s
+
+    return poster
+
+
+def encode_poster(poster: Image.Image, lossless: bool = False) -> bytes:
+    buf = BytesIO()
+    if lossless:
+        poster.save(buf, "PNG")
+    else:
+        poster.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+# =========================
+# PHOTO HELPERS
+# =========================
+
+def _photo_data_url(mime: str, data: bytes) -> str:
+    buf = bytearray(b"data:")
+    buf += mime.encode("ascii")
+    buf += b";base64,"
+    buf += base64.b64encode(memoryview(data))
+    return buf.decode("ascii")
+
+
+@st.cache_data(max_entries=4)
+def _agent_photo(data: bytes) -> tuple:
+    """
+    Shrink the upload to what the footer circle can show before using it;
+    phone photos are often several MB but are drawn at 150px. Returns
+    (mime, bytes): JPEG normally, PNG when the photo has transparency so a
+    cut-out keeps showing the footer colour behind it.
+    """
+    img = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    # the circle is cover-cropped, so it is the shorter side that must not drop
+    # below px; crop to the square up front and never upscale
+    side = min(FOOTER_PHOTO_SIZE * max(2, POSTER_DPR), *img.size)
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    img = ImageOps.fit(img.convert("RGBA" if has_alpha else "RGB"), (side, side), Image.LANCZOS)
+    buf = BytesIO()
+    if has_alpha:
+        img.save(buf, "PNG", optimize=True)
+        return "image/png", buf.getvalue()
+    img.save(buf, "JPEG", quality=88, optimize=True)
+    return "image/jpeg", buf.getvalue()
+
+
+# =========================
+# BACKGROUND WORK
+# =========================
+
+@st.cache_resource
+def _get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+
+# cached so Streamlit reruns share the pools instead of leaking new ones each
+# time. Gemini calls are multi-second network waits, so they get their own wide
+# pool and can never queue ahead of photo / Chromium work from other sessions.
+_GEMINI_EXECUTOR = _get_executor("gemini", 16)
+_RENDER_EXECUTOR = _get_executor("render", 4)
+
+
+@st.cache_data(ttl=600, max_entries=16, show_spinner=False)
+def _generate_variants(style_mode: str, nonce: int = 0) -> list[dict]:
+    """
+    Gemini copy for `style_mode`, reused for 10 minutes so repeat clicks skip
+    the round-trip. Bump `nonce` to force fresh text.
+    """
+    return generate_text(style_mode)
 
 
 # =========================
@@ -448,82 +941,110 @@ name = st.text_input("Name (English or Tamil)", os.getenv("AGENT_NAME", "Selvara
 role = st.text_input("Role (English or Tamil)", os.getenv("AGENT_ROLE", "இன்ஷூரன்ஸ் முகவர்"))
 number = st.text_input("Phone Number", os.getenv("AGENT_PHONE", "9842761070"))
 
-style_mode = st.selectbox(
-    "Content style",
-    ["Standard marketing", "Conversation", "Fact-based awareness"],
-)
+style_mode = st.selectbox("Content style", STYLE_MODES)
 
 uploaded_img = st.file_uploader("Upload Agent Photo", type=["jpg", "jpeg", "png"])
+lossless = st.checkbox("Lossless PNG (larger file)", value=False)
 
-if st.button("Generate Poster"):
+generate = st.button("Generate Poster")
+regenerate = st.button("Regenerate text", help="Ask Gemini for new copy instead of reusing the last one")
+if regenerate:
+    st.session_state["text_nonce"] = st.session_state.get("text_nonce", 0) + 1
+
+if generate or regenerate:
     if uploaded_img is None:
         st.error("Please upload the agent photo.")
         st.stop()
 
-    st.info(f"Generating Tamil insurance copy with Gemini… (Style: {style_mode})")
-    agent_img_bytes = uploaded_img.read()
-
-    try:
-        text_spec = generate_text(style_mode)
-    except Exception as e:
-        st.error(f"Text generation failed: {e}")
+    with st.status(
+        f"Generating Tamil insurance copy with Gemini… (Style: {style_mode})"
+    ) as status:
+        fut_text = _GEMINI_EXECUTOR.submit(
+            _generate_variants, style_mode, st.session_state.get("text_nonce", 0)
+        )
+        # decode and shrink the photo during the Gemini round-trip; the render
+        # step below then gets it from _agent_photo's cache
+        fut_photo = _RENDER_EXECUTOR.submit(_agent_photo, uploaded_img.getvalue())
+        if not USE_PILLOW:
+            # launch Chromium and load the poster shell while Gemini is still thinking
+            _RENDER_EXECUTOR.submit(get_poster_page)
+        try:
+            st.session_state["variants"] = fut_text.result()
+        except Exception as e:
+            status.update(label="Text generation failed", state="error")
+            st.error(f"Text generation failed: {e}")
+            st.stop()
+        try:
+            fut_photo.result()
+        except Exception:
+            pass  # reported by the render step, which decodes it again
+        status.update(label="Tamil copy ready", state="complete")
+
+variants = st.session_state.get("variants")
+if variants:
+    if uploaded_img is None:
+        st.error("Please upload the agent photo.")
         st.stop()
 
+    variant_idx = st.selectbox(
+        "Variant",
+        range(len(variants)),
+        format_func=lambda i: f"{i + 1}. {variants[i].get('headline_ta', '')}",
+    )
+    text_spec = variants[variant_idx]
+
     # Theme & text colors
     top_color, bottom_color, footer_color = theme_colors(text_spec["color_theme"])
     headline_color = color_from_name(text_spec["text_colors"]["headline"], "#0f172a")
     body_color = color_from_name(text_spec["text_colors"]["body"], "#111827")
     cta_color = color_from_name(text_spec["text_colors"]["cta"], "#b91c1c")
 
-    # Agent photo → data URL
-    b64_photo = base64.b64encode(agent_img_bytes).decode("ascii")
-    photo_data_url = f"data:image/png;base64,{b64_photo}"
-
-    # Local Tamil fonts → data URLs
-    with open("NotoSansTamil-Regular.ttf", "rb") as f:
-        reg_b64 = base64.b64encode(f.read()).decode("ascii")
-    with open("NotoSansTamil-Bold.ttf", "rb") as f:
-        bold_b64 = base64.b64encode(f.read()).decode("ascii")
-
-    regular_font_data_url = f"data:font/ttf;base64,{reg_b64}"
-    bold_font_data_url = f"data:font/ttf;base64,{bold_b64}"
-
-    # Render HTML
-    html = POSTER_HTML.render(
-        width=POSTER_WIDTH,
-        height=POSTER_HEIGHT,
-        footer_height=FOOTER_HEIGHT,
-        top_color=top_color,
-        bottom_color=bottom_color,
-        footer_color=footer_color,
-        headline_color=headline_color,
-        body_color=body_color,
-        cta_color=cta_color,
-        headline=text_spec["headline_ta"],
-        subheadline=text_spec.get("subheadline_ta", ""),
-        body_paragraph=text_spec["body_paragraph_ta"],
-        bullet_points=text_spec["bullet_points_ta"],
-        cta_line=text_spec["cta_line_ta"],
-        agent_name=name,
-        agent_role=role,
-        agent_phone=number,
-        photo_data_url=photo_data_url,
-        regular_font_data_url=regular_font_data_url,
-        bold_font_data_url=bold_font_data_url,
-    )
-
-    st.info("Rendering square poster via headless Chromium…")
-
     try:
-        poster_bytes = html_to_png(html, POSTER_WIDTH, POSTER_HEIGHT)
+        photo_mime, photo_bytes = _agent_photo(uploaded_img.getvalue())
     except Exception as e:
-        st.error(f"HTML → PNG rendering failed: {e}")
+        st.error(f"Could not read the agent photo: {e}")
         st.stop()
 
+    poster_data = {
+        "top_color": top_color,
+        "bottom_color": bottom_color,
+        "footer_color": footer_color,
+        "headline_color": headline_color,
+        "body_color": body_color,
+        "cta_color": cta_color,
+        "headline": text_spec.get("headline_ta") or "",
+        "subheadline": text_spec.get("subheadline_ta") or "",
+        "body_paragraph": text_spec.get("body_paragraph_ta") or "",
+        "bullet_points": [str(b) for b in text_spec["bullet_points_ta"]],
+        "cta_line": text_spec.get("cta_line_ta") or "",
+        "agent_name": name,
+        "agent_role": role,
+        "agent_phone": number,
+    }
+
+    with st.status("Rendering square poster…") as status:
+        try:
+            if USE_PILLOW and pillow_can_draw(poster_data):
+                # cheap and the script thread would only wait on it, so no pool
+                poster_bytes = encode_poster(
+                    render_with_pillow(poster_data, photo_bytes), lossless
+                )
+            else:
+                poster_data["photo_data_url"] = _photo_data_url(photo_mime, photo_bytes)
+                fut_image = _RENDER_EXECUTOR.submit(poster_to_image, poster_data, lossless)
+                poster_bytes = fut_image.result()
+        except Exception as e:
+            status.update(label="Rendering failed", state="error")
+            st.error(f"Poster rendering failed: {e}")
+            st.stop()
+        status.update(label="Poster ready", state="complete")
+
+    ext, mime = ("png", "image/png") if lossless else ("jpg", "image/jpeg")
+    # encoded bytes go out as-is; a PIL Image would be re-encoded by st.image
     st.image(poster_bytes, caption="Generated Poster", use_container_width=True)
     st.download_button(
         label="Download Poster",
         data=poster_bytes,
-        file_name="insurance_poster_tamil_square.png",
-        mime="image/png",
+        file_name=f"insurance_poster_tamil_square.{ext}",
+        mime=mime,
     )